@@ -1,4 +1,6 @@
 #!/usr/bin/env python3
+import io
+import queue
 import socket
 import struct
 import pyarrow as pa
@@ -8,43 +10,259 @@ import pyarrow.ipc as ipc
 KDB_HOST = "localhost"
 KDB_PORT = 5001
 KDB_COMMAND = "getArrowData"  # Command to request Arrow data from kdb+
-BUFFER_SIZE = 16384  # Size (in bytes) for each socket.recv() call
+BUFFER_SIZE = 1 << 20  # Maximum size (in bytes) for each socket.recv() call
+RCVBUF_SIZE = 8 << 20  # Requested SO_RCVBUF; None leaves the kernel's autotuning alone
 
-def fetch_arrow_table(host=KDB_HOST, port=KDB_PORT, command=KDB_COMMAND, buffer_size=BUFFER_SIZE):
+# MSG_WAITALL makes each body recv block until its whole chunk has arrived, so a
+# payload takes ~total_length/BUFFER_SIZE syscalls rather than one per TCP segment.
+_MSG_WAITALL = getattr(socket, "MSG_WAITALL", 0)
+
+# Frame header: total length of the Arrow IPC payload, network byte order (big-endian).
+_HDR = struct.Struct("!Q")
+
+def _connect(host, port):
+    """
+    Opens a TCP connection to the kdb+ server, tuned for large responses: Nagle is
+    disabled so the short command isn't delayed, and the receive buffer is enlarged
+    (before connecting, so the TCP window scale is negotiated for it). Note that the
+    kernel caps SO_RCVBUF at net.core.rmem_max.
+    """
+    s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    try:
+        s.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        if RCVBUF_SIZE:
+            s.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, RCVBUF_SIZE)
+        s.connect((host, port))
+    except BaseException:
+        s.close()
+        raise
+    return s
+
+def _recv_into_exact(s, view, chunk_size, closed_message, flags=0):
+    """
+    Fills the writable memoryview `view` from socket `s`, at most chunk_size bytes per
+    recv, raising ConnectionError(closed_message) if the peer closes first. A recv
+    may return short (even with MSG_WAITALL, e.g. on a signal); the loop resumes.
+    """
+    total = len(view)
+    offset = 0
+    while offset < total:
+        n = s.recv_into(view[offset:offset + min(chunk_size, total - offset)], 0, flags)
+        if not n:
+            raise ConnectionError(closed_message)
+        offset += n
+
+def _read_header(s):
+    """Reads the 8-byte frame header and returns the length of the Arrow IPC payload."""
+    header = bytearray(_HDR.size)
+    _recv_into_exact(s, memoryview(header), _HDR.size, "Socket closed before header received")
+    (total_length,) = _HDR.unpack_from(header)
+    return total_length
+
+def _send_commands(s, commands):
+    # Send the commands in one write, newline-delimited and encoded in Latin-1
+    # (compatible with ASCII)
+    s.sendall(b"".join(command.encode("latin1") + b"\n" for command in commands))
+
+def _read_payload(s, buffer_size):
+    """Reads one framed Arrow IPC payload from the connected socket `s`, as a pa.Buffer."""
+    # Read the 8-byte header to determine total length of the Arrow IPC payload.
+    total_length = _read_header(s)
+
+    # Read the remaining data straight into a preallocated Arrow buffer so the
+    # payload is only ever copied once (kernel -> buffer).
+    buf = pa.allocate_buffer(total_length, resizable=False)
+    _recv_into_exact(s, memoryview(buf), buffer_size, "Socket closed before full data received", _MSG_WAITALL)
+    return buf
+
+def _with_connection(host, port, pool, fn):
+    """
+    Calls fn(s) with a socket borrowed from `pool`, or with a new connection to
+    host:port if pool is None. A pooled socket is discarded if fn fails, since it may
+    have been left mid-response.
+    """
+    if pool is None:
+        with _connect(host, port) as s:
+            return fn(s)
+    s = pool.borrow()
+    try:
+        result = fn(s)
+    except BaseException:
+        pool.discard(s)
+        raise
+    pool.release(s)
+    return result
+
+class _PayloadReader(io.RawIOBase):
+    """
+    Raw, read-only file over the next `length` bytes of a socket (one Arrow IPC
+    payload), so the IPC reader can decode batches while later ones are still arriving.
+    """
+    def __init__(self, s, length):
+        self._s = s
+        self.remaining = length
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        if not self.remaining:
+            return 0
+        n = self._s.recv_into(b, min(len(b), self.remaining))
+        if not n:
+            raise ConnectionError("Socket closed before full data received")
+        self.remaining -= n
+        return n
+
+    def drain(self):
+        # Consume whatever of the payload the IPC reader left unread, so the socket is
+        # positioned at the next response.
+        scratch = bytearray(min(self.remaining, BUFFER_SIZE))
+        while self.remaining:
+            self.readinto(memoryview(scratch)[:self.remaining])
+
+class KdbConnectionPool:
+    """
+    Keeps up to `size` connections to one kdb+ server open and lends them out, so
+    repeated fetches skip the TCP handshake and slow-start ramp of a new connection.
+
+    borrow() blocks while every connection is lent out. Idle connections use TCP
+    keepalive, and one the server has closed (or that has unread data) is replaced
+    with a fresh connection when it is next borrowed.
+    """
+    def __init__(self, host=KDB_HOST, port=KDB_PORT, size=4):
+        self.host = host
+        self.port = port
+        # LIFO, so the most recently used (warmest) connection is lent out first. A
+        # None entry is a slot whose connection has to be (re)opened.
+        self._idle = queue.LifoQueue()
+        try:
+            for _ in range(size):
+                self._idle.put(self._new())
+        except BaseException:
+            # The pool is never returned, so nothing else would close the connections
+            # already opened.
+            self.close()
+            raise
+
+    def _new(self):
+        s = _connect(self.host, self.port)
+        s.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+        return s
+
+    @staticmethod
+    def _is_stale(s):
+        # Between requests nothing should be readable: EOF means the server closed the
+        # connection, and any stray bytes would corrupt the next response.
+        s.setblocking(False)
+        try:
+            s.recv(1, socket.MSG_PEEK)
+        except BlockingIOError:
+            return False
+        except OSError:
+            return True
+        finally:
+            s.setblocking(True)
+        return True
+
+    def borrow(self):
+        """Returns a connected socket; hand it back with release() or discard()."""
+        s = self._idle.get()
+        if s is not None and not self._is_stale(s):
+            return s
+        if s is not None:
+            s.close()
+        try:
+            return self._new()
+        except BaseException:
+            self._idle.put(None)
+            raise
+
+    def release(self, s):
+        """Returns a socket that finished its request cleanly to the pool."""
+        self._idle.put(s)
+
+    def discard(self, s):
+        """Closes a socket left in an unknown state (e.g. a failed request)."""
+        s.close()
+        self._idle.put(None)
+
+    def close(self):
+        """Closes the idle connections."""
+        while True:
+            try:
+                s = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            if s is not None:
+                s.close()
+
+def fetch_arrow_table(host=KDB_HOST, port=KDB_PORT, command=KDB_COMMAND, buffer_size=BUFFER_SIZE, pool=None):
     """
     Connects to the kdb+ server, sends the command, reads the 8-byte header to determine the payload length,
     and then reads the full Arrow IPC stream. Returns a PyArrow Table.
+
+    If `pool` (a KdbConnectionPool) is given, a connection is borrowed from it instead
+    of opening one, and host/port are ignored.
     """
-    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-        s.connect((host, port))
-        # Send command encoded in Latin-1 (compatible with ASCII)
-        s.sendall(command.encode("latin1") + b"\n")
-
-        # Read the 8-byte header to determine total length of the Arrow IPC payload.
-        header = b""
-        while len(header) < 8:
-            chunk = s.recv(8 - len(header))
-            if not chunk:
-                raise ConnectionError("Socket closed before header received")
-            header += chunk
-        total_length = struct.unpack("!Q", header)[0]  # Network byte order (big-endian)
-
-        # Read the remaining data based on the header’s total_length.
-        data = bytearray()
-        bytes_remaining = total_length
-        while bytes_remaining > 0:
-            recv_size = min(buffer_size, bytes_remaining)
-            chunk = s.recv(recv_size)
-            if not chunk:
-                raise ConnectionError("Socket closed before full data received")
-            data.extend(chunk)
-            bytes_remaining -= len(chunk)
-
-    # Use a BufferReader to allow PyArrow's RecordBatchStreamReader to parse the stream.
-    reader = ipc.RecordBatchStreamReader(pa.BufferReader(bytes(data)))
+    def request(s):
+        _send_commands(s, [command])
+        return _read_payload(s, buffer_size)
+    buf = _with_connection(host, port, pool, request)
+
+    # Reading from a BufferReader over a pa.Buffer is zero-copy: column buffers are
+    # slices of buf rather than copies of it.
+    reader = ipc.RecordBatchStreamReader(pa.BufferReader(buf))
     arrow_table = reader.read_all()
     return arrow_table
 
+def fetch_arrow_batches(host=KDB_HOST, port=KDB_PORT, command=KDB_COMMAND, buffer_size=BUFFER_SIZE, pool=None):
+    """
+    Like fetch_arrow_table, but a generator yielding each PyArrow RecordBatch as soon
+    as it has been received and decoded, so the caller can start on the first batches
+    while the rest of the payload is still in flight.
+
+    If `pool` (a KdbConnectionPool) is given, a connection is borrowed from it and
+    returned once the stream has been read to the end (discarded if the generator is
+    closed early or fails).
+    """
+    s = _connect(host, port) if pool is None else pool.borrow()
+    complete = False
+    try:
+        _send_commands(s, [command])
+        payload = _PayloadReader(s, _read_header(s))
+        reader = ipc.RecordBatchStreamReader(io.BufferedReader(payload, buffer_size))
+        for batch in reader:
+            yield batch
+        payload.drain()
+        complete = True
+    finally:
+        if pool is None:
+            s.close()
+        elif complete:
+            pool.release(s)
+        else:
+            pool.discard(s)
+
+def fetch_arrow_tables(commands, host=KDB_HOST, port=KDB_PORT, buffer_size=BUFFER_SIZE, pool=None):
+    """
+    Sends all `commands` in one newline-delimited write and reads back one framed
+    Arrow IPC stream per command, in order, over the same connection. Returns a list
+    of PyArrow Tables. The batch costs one round-trip instead of one per command; the
+    server answers each line of the message in turn.
+
+    If `pool` (a KdbConnectionPool) is given, a connection is borrowed from it instead
+    of opening one, and host/port are ignored.
+    """
+    commands = list(commands)
+    if not commands:
+        return []
+    def request(s):
+        _send_commands(s, commands)
+        return [_read_payload(s, buffer_size) for _ in commands]
+    bufs = _with_connection(host, port, pool, request)
+    return [ipc.RecordBatchStreamReader(pa.BufferReader(buf)).read_all() for buf in bufs]
+
 if __name__ == "__main__":
     try:
         table = fetch_arrow_table()
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+import select
+import socket
+import threading
+import pyarrow as pa
+import pyarrow.ipc as ipc
+
+from Arrow_client import KDB_HOST, KDB_PORT, KDB_COMMAND, BUFFER_SIZE, _HDR, _send_commands, _with_connection
+from Arrow_client import fetch_arrow_table as fetch_arrow_table_recv
+
+# Try to import the liburing binding (pip install "liburing>=2026.1"; the Ring/Cqe API).
+# If not installed, liburing will be None and fetch_arrow_table falls back to the plain
+# recv() client.
+try:
+    import liburing
+except ImportError:
+    liburing = None
+
+# --- Parameter Defaults ---
+RING_ENTRIES = 256  # Submission queue depth of each thread's ring
+
+# Errors meaning this binding/kernel can't run the ring path: too old a binding (no
+# Ring/Cqe, different signatures) or too old a kernel for io_uring or the setup flags.
+_UNSUPPORTED = (AttributeError, TypeError, OSError)
+
+class _ThreadRing:
+    """
+    A ring owned by one thread, set up on its first fetch and kept for the thread's
+    lifetime, so fetches don't each pay for io_uring_setup/mmap/teardown.
+    """
+    def __init__(self):
+        self.ring = liburing.Ring()
+        self.cqe = liburing.Cqe()
+        # Only the owning thread ever touches the ring. (Not DEFER_TASKRUN: that ring's
+        # fd doesn't signal POLLIN until task work is run by a wait.)
+        liburing.io_uring_queue_init(RING_ENTRIES, self.ring,
+                                     liburing.IORING_SETUP_COOP_TASKRUN
+                                     | liburing.IORING_SETUP_SINGLE_ISSUER)
+        self.open = True
+        # The binding's io_uring_wait_cqe blocks without releasing the GIL, so waits
+        # happen in poll() on the ring fd and wait_cqe is only called once a completion
+        # is ready.
+        self.poller = select.poll()
+        self.poller.register(self.ring.ring_fd, select.POLLIN)
+
+    def __del__(self):
+        # Runs when the owning thread exits (its thread-local state is released).
+        self.close()
+
+    def close(self):
+        if getattr(self, "open", False):
+            self.open = False
+            liburing.io_uring_queue_exit(self.ring)
+
+    def recv(self, fd, buf):
+        """
+        One MSG_WAITALL recv of socket `fd` into the bytearray `buf`; returns the number
+        of bytes received (less than len(buf) only on a signal or peer shutdown).
+        """
+        sqe = liburing.io_uring_get_sqe(self.ring)
+        liburing.io_uring_prep_recv(sqe, fd, buf, socket.MSG_WAITALL)
+        sqe.user_data = _RECV
+        liburing.io_uring_submit(self.ring)
+        try:
+            self.poller.poll()
+        except BaseException:
+            # Interrupted (e.g. KeyboardInterrupt) with the recv still armed: the kernel
+            # may yet write into buf, so it must not be freed before the recv is reaped.
+            self._cancel(buf)
+            raise
+        (res,) = self._reap(1)
+        return liburing.trap_error(res)  # Raises OSError for negative errno results
+
+    def _reap(self, count):
+        results = []
+        while len(results) < count:
+            liburing.io_uring_wait_cqe(self.ring, self.cqe)
+            cqe = self.cqe[0]
+            if cqe.user_data == _RECV:
+                results.append(cqe.res)
+            liburing.io_uring_cqe_seen(self.ring, cqe)
+        return results
+
+    def _cancel(self, buf):
+        # Cancel the armed recv and reap its completion (-ECANCELED, or its result if it
+        # finished first), leaving the ring empty for the thread's next fetch.
+        try:
+            sqe = liburing.io_uring_get_sqe(self.ring)
+            liburing.io_uring_prep_cancel64(sqe, _RECV)
+            sqe.user_data = _CANCEL
+            liburing.io_uring_submit(self.ring)
+            self._reap(1)
+        except BaseException:
+            # Couldn't confirm the recv is gone: stop using this ring, and keep buf alive
+            # for the rest of the process in case the kernel still writes into it.
+            _ABANDONED.append(buf)
+            _local.ring = None
+            self.close()
+            raise
+
+# user_data tags of the ring's SQEs.
+_RECV = 1
+_CANCEL = 2
+
+# Buffers that an abandoned ring may still write into; never freed.
+_ABANDONED = []
+
+_local = threading.local()
+
+def _thread_ring():
+    """Returns this thread's _ThreadRing, or None if the ring path is unavailable."""
+    ring = getattr(_local, "ring", False)
+    if ring is False:
+        try:
+            ring = _ThreadRing()
+        except _UNSUPPORTED:
+            ring = None
+        _local.ring = ring
+    return ring
+
+def _uring_recv_exact(ring, s, buf, closed_message):
+    """
+    Fills the bytearray `buf` from socket `s`. A well-behaved stream is received with
+    one submission straight into `buf`; after a short completion the remainder is
+    received separately and copied into place (the binding can't take an offset).
+    """
+    n = ring.recv(s.fileno(), buf)
+    offset = n
+    while offset < len(buf):
+        if not n:
+            raise ConnectionError(closed_message)
+        rest = bytearray(len(buf) - offset)
+        n = ring.recv(s.fileno(), rest)
+        buf[offset:offset + n] = memoryview(rest)[:n]
+        offset += n
+
+def fetch_arrow_table(host=KDB_HOST, port=KDB_PORT, command=KDB_COMMAND, buffer_size=BUFFER_SIZE, pool=None):
+    """
+    Same contract as Arrow_client.fetch_arrow_table, but receives the header and the
+    Arrow IPC payload through io_uring. Falls back to the plain recv() client when
+    liburing is not installed or the binding/kernel cannot run the ring.
+
+    On loopback this measures no faster than the recv() client, whose MSG_WAITALL body
+    reads already take about one syscall per BUFFER_SIZE; prefer that one unless a
+    measurement on the target host says otherwise.
+    """
+    ring = _thread_ring() if liburing is not None else None
+    if ring is None:
+        return fetch_arrow_table_recv(host, port, command, buffer_size, pool)
+
+    def request(s):
+        _send_commands(s, [command])
+        header = bytearray(_HDR.size)
+        _uring_recv_exact(ring, s, header, "Socket closed before header received")
+        (total_length,) = _HDR.unpack_from(header)
+        body = bytearray(total_length)
+        _uring_recv_exact(ring, s, body, "Socket closed before full data received")
+        return body
+    try:
+        body = _with_connection(host, port, pool, request)
+    except (AttributeError, TypeError):
+        # The binding's API doesn't match the one targeted here: stop using the ring on
+        # this thread and redo the request on the recv() path (a pooled socket has
+        # already been discarded, as it may be left mid-response).
+        _local.ring = None
+        return fetch_arrow_table_recv(host, port, command, buffer_size, pool)
+
+    # pa.py_buffer wraps the bytearray without copying it, so as with the recv()
+    # client the payload is only ever copied once (kernel -> buffer).
+    reader = ipc.RecordBatchStreamReader(pa.BufferReader(pa.py_buffer(body)))
+    return reader.read_all()
+
+if __name__ == "__main__":
+    try:
+        table = fetch_arrow_table()
+        print("Arrow Table Received:")
+        print(table)
+    except Exception as e:
+        print(f"Error fetching Arrow table: {e}")
@@ -1,6 +1,8 @@
 import datetime
+from functools import lru_cache
 import numpy as np
-from typing import Any, Dict, List, Optional, Union
+from weakref import WeakValueDictionary
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
 
 # Try to import Polars. If not installed, pl will be None.
 try:
@@ -8,22 +10,115 @@ try:
 except ImportError:
     pl = None
 
+# Try to import the compiled list renderers (cythonize -i qrepr_ext.pyx). If not
+# built, qrepr_ext will be None and the pure-Python renderers are used instead.
+try:
+    import qrepr_ext
+except ImportError:
+    qrepr_ext = None
+
 class QSymbol:
     """
     Represents a q symbol literal.
     
     For example, QSymbol("abc") becomes the q literal `abc.
+    
+    Instances are interned: QSymbol("abc") returns the existing live instance for
+    "abc" if there is one, so repeated symbols share one object and identical symbols
+    compare with `is`. Because instances are shared, they are immutable: assigning or
+    deleting value raises AttributeError.
     """
     __match_args__ = ("value",)
+    __slots__ = ("value", "__weakref__")
+
+    # Live instances by value; entries disappear once an instance is garbage collected.
+    _pool: "WeakValueDictionary[str, QSymbol]" = WeakValueDictionary()
+
+    def __init_subclass__(cls, **kwargs: Any) -> None:
+        # Each subclass interns separately, so QSymbol("a") never returns a subclass
+        # instance (or vice versa).
+        super().__init_subclass__(**kwargs)
+        cls._pool = WeakValueDictionary()
+
+    def __new__(cls, value: str) -> "QSymbol":
+        """
+        Return the interned QSymbol for value, creating it if needed.
+        
+        Args:
+            value (str): The string representation of the symbol.
+            
+        Returns:
+            QSymbol: The shared instance for value.
+        """
+        existing: Optional[QSymbol] = cls._pool.get(value)
+        if existing is not None:
+            return existing
+        obj: QSymbol = object.__new__(cls)
+        object.__setattr__(obj, "value", value)
+        return cls._pool.setdefault(value, obj)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        """
+        Refuse attribute assignment: changing an interned instance would change every
+        QSymbol for its old value, and its hash while held in dicts and sets.
+        
+        Raises:
+            AttributeError: Always.
+        """
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __delattr__(self, name: str) -> None:
+        """
+        Refuse attribute deletion, as for assignment.
+        
+        Raises:
+            AttributeError: Always.
+        """
+        raise AttributeError(f"{type(self).__name__} is immutable")
 
     def __init__(self, value: str) -> None:
         """
         Initialize a QSymbol instance.
         
+        The value is set by __new__, so interned instances aren't re-initialized.
+        
         Args:
             value (str): The string representation of the symbol.
         """
-        self.value: str = value
+
+    def __reduce__(self) -> Tuple[type, Tuple[str]]:
+        """
+        Pickle/copy support: reconstruct through __new__ so copies are interned too.
+        
+        Returns:
+            Tuple[type, Tuple[str]]: The class and its constructor arguments.
+        """
+        return type(self), (self.value,)
+
+    def __eq__(self, other: object) -> bool:
+        """
+        Compare by value (interned instances are also identical).
+        
+        Args:
+            other (object): The object to compare with.
+            
+        Returns:
+            bool: True if other is a QSymbol with the same value.
+        """
+        if self is other:
+            return True
+        if isinstance(other, QSymbol):
+            return self.value == other.value
+        return NotImplemented
+
+    def __hash__(self) -> int:
+        """
+        Hash by value, consistent with __eq__.
+        
+        Returns:
+            int: Hash of the symbol's value.
+        """
+        return hash(self.value)
 
     def __str__(self) -> str:
         """
@@ -44,13 +139,199 @@ class QSymbol:
         return f"QSymbol({self.value})"
 
 
+# Translation table for escaping characters inside q string literals.
+_ESCAPE_TABLE = str.maketrans({'"': '\\"', "\\": "\\\\"})
+
+
+# --- Leaf literals ---
+# Symbols and temporal values recur across many queries (the same instrument or
+# start date for a whole batch), so their literals are memoized. They are keyed on
+# the raw field values rather than the objects: aware datetimes/times compare equal
+# across time zones, while the rendered literal ignores tzinfo.
+LEAF_CACHE_SIZE = 4096
+
+@lru_cache(maxsize=LEAF_CACHE_SIZE)
+def _qsymbol_literal(value: str) -> str:
+    return f"`{value}"
+
+@lru_cache(maxsize=LEAF_CACHE_SIZE)
+def _datetime_literal(year: int, month: int, day: int, hour: int, minute: int, second: int, microsecond: int) -> str:
+    # Format as "YYYY.MM.DDDHH:MM:SS.mmm" with a D separator.
+    return f'"{year:04d}.{month:02d}.{day:02d}D{hour:02d}:{minute:02d}:{second:02d}.{microsecond // 1000:03d}"'
+
+@lru_cache(maxsize=LEAF_CACHE_SIZE)
+def _date_literal(year: int, month: int, day: int) -> str:
+    # Render date as "YYYY.MM.DD".
+    return f'"{year:04d}.{month:02d}.{day:02d}"'
+
+@lru_cache(maxsize=LEAF_CACHE_SIZE)
+def _time_literal(hour: int, minute: int, second: int, microsecond: int) -> str:
+    # Render time as "HH:MM:SS.mmm".
+    return f'"{hour:02d}:{minute:02d}:{second:02d}.{microsecond // 1000:03d}"'
+
+@lru_cache(maxsize=LEAF_CACHE_SIZE)
+def _timedelta_literal(days: int, seconds: int, microseconds: int) -> str:
+    # Convert timedelta to a q timespan literal ("hh:mm:ss.mmm").
+    total_seconds: int = int(((days * 86400 + seconds) * 10**6 + microseconds) / 10**6)
+    hours, rem = divmod(total_seconds, 3600)
+    minutes, secs = divmod(rem, 60)
+    millis: int = microseconds // 1000
+    timespan_str: str = f"{hours:02d}:{minutes:02d}:{secs:02d}.{millis:03d}"
+    return f'"{timespan_str}"'
+
+
+# --- Formatters ---
+# Each formatter takes the builder class (so containers can recurse through
+# cls.qrepr) and the object to render, and returns its q literal.
+
+def _fmt_qsymbol(cls: type, obj: QSymbol) -> str:
+    return _qsymbol_literal(obj.value)
+
+def _fmt_bool(cls: type, obj: bool) -> str:
+    return "1b" if obj else "0b"
+
+def _fmt_str(cls: type, obj: str) -> str:
+    # Escape embedded double quotes and backslashes; most strings need neither.
+    if '"' not in obj and "\\" not in obj:
+        return f'"{obj}"'
+    return f'"{obj.translate(_ESCAPE_TABLE)}"'
+
+def _fmt_number(cls: type, obj: Union[int, float]) -> str:
+    return str(obj)
+
+def _write_list(cls: type, obj: Union[list, tuple], out: List[str]) -> None:
+    # Render lists/tuples as space-separated q literals. Nested containers append to
+    # the same out buffer; everything else is dispatched like QQueryBuilder.qrepr.
+    tp: type = type(obj)
+    if (tp is list or tp is tuple) and len(obj) > 1:
+        types = set(map(type, obj))
+        if len(types) == 1:
+            renderer = _LIST_RENDERERS.get(types.pop())
+            if renderer is not None:
+                out.append(renderer(obj))
+                return
+    dispatch = cls._DISPATCH
+    resolved = cls._RESOLVED
+    append = out.append
+    sep: bool = False
+    for item in obj:
+        if sep:
+            append(" ")
+        sep = True
+        tp: type = type(item)
+        handler = dispatch.get(tp) or resolved.get(tp) or cls._resolve(tp)
+        writer = _WRITERS.get(handler)
+        if writer is None:
+            append(handler(cls, item))
+        else:
+            writer(cls, item, out)
+
+def _write_dict(cls: type, obj: dict, out: List[str]) -> None:
+    # Render as dictionary: keys!values (both as space-separated lists).
+    _write_list(cls, obj.keys(), out)
+    out.append("!")
+    _write_list(cls, obj.values(), out)
+
+def _fmt_list(cls: type, obj: Union[list, tuple]) -> str:
+    out: List[str] = []
+    _write_list(cls, obj, out)
+    return "".join(out)
+
+def _fmt_dict(cls: type, obj: dict) -> str:
+    out: List[str] = []
+    _write_dict(cls, obj, out)
+    return "".join(out)
+
+def _fmt_datetime(cls: type, obj: datetime.datetime) -> str:
+    return _datetime_literal(obj.year, obj.month, obj.day, obj.hour, obj.minute, obj.second, obj.microsecond)
+
+def _fmt_date(cls: type, obj: datetime.date) -> str:
+    return _date_literal(obj.year, obj.month, obj.day)
+
+def _fmt_time(cls: type, obj: datetime.time) -> str:
+    return _time_literal(obj.hour, obj.minute, obj.second, obj.microsecond)
+
+def _fmt_timedelta(cls: type, obj: datetime.timedelta) -> str:
+    return _timedelta_literal(obj.days, obj.seconds, obj.microseconds)
+
+def _fmt_np_generic(cls: type, obj: Any) -> str:
+    return str(obj.item())
+
+def _fmt_ndarray(cls: type, obj: np.ndarray) -> str:
+    if obj.ndim == 1:
+        kind: str = obj.dtype.kind
+        # Vectorized paths for flat numeric/boolean arrays. str() over tolist()
+        # keeps the output identical to formatting each element as a Python scalar.
+        if kind == "b":
+            return " ".join(np.where(obj, "1b", "0b").tolist())
+        if kind in "iu":
+            return _LIST_RENDERERS[int](obj.tolist())
+        if kind == "f":
+            return _LIST_RENDERERS[float](obj.tolist())
+    elif obj.ndim > 1:
+        # Recurse over the outer axis only, so each row takes a vectorized path.
+        return " ".join(cls.qrepr(row) for row in obj)
+    return cls.qrepr(obj.tolist())
+
+def _fmt_pl_dataframe(cls: type, obj: Any) -> str:
+    # Convert to a dictionary of columns (assumed to be lists).
+    return cls.qrepr(obj.to_dict(False))
+
+def _fmt_pl_series(cls: type, obj: Any) -> str:
+    return cls.qrepr(obj.to_list())
+
+def _fmt_none(cls: type, obj: None) -> str:
+    return "0N"
+
+def _fmt_fallback(cls: type, obj: Any) -> str:
+    # Fallback: use str() conversion.
+    return str(obj)
+
+# Container formatters that can append into a caller's buffer instead of returning
+# their own string, so nested containers share one output list.
+_WRITERS: Dict[Callable[[type, Any], str], Callable[[type, Any, List[str]], None]] = {
+    _fmt_list: _write_list,
+    _fmt_dict: _write_dict,
+}
+
+# Renderers for lists whose elements all share one exact type, used by _write_list
+# instead of dispatching each element. Each returns what the per-element formatters
+# would, joined with spaces.
+
+def _render_numbers(xs: Union[list, tuple]) -> str:
+    return " ".join(map(str, xs))
+
+def _render_strs(xs: Union[list, tuple]) -> str:
+    return " ".join([_fmt_str(QQueryBuilder, x) for x in xs])
+
+def _render_qsymbols(xs: Union[list, tuple]) -> str:
+    return " ".join([_qsymbol_literal(x.value) for x in xs])
+
+# float stays on _render_numbers even when qrepr_ext is built: CPython's float repr
+# already runs in C, and the extension's per-element call was measured slower.
+if qrepr_ext is not None:
+    _LIST_RENDERERS: Dict[type, Callable[[Union[list, tuple]], str]] = {
+        int: qrepr_ext.render_int_list,
+        float: _render_numbers,
+        str: qrepr_ext.render_str_list,
+        QSymbol: qrepr_ext.render_qsymbol_list,
+    }
+else:
+    _LIST_RENDERERS = {
+        int: _render_numbers,
+        float: _render_numbers,
+        str: _render_strs,
+        QSymbol: _render_qsymbols,
+    }
+
+
 class QQueryBuilder:
     """
     A builder for constructing valid q string queries from Python input types.
     
     Supported types include:
       • QSymbol: rendered as a q symbol literal (e.g. `sym)
-      • str: rendered as a quoted string with embedded quotes escaped
+      • str: rendered as a quoted string with embedded quotes and backslashes escaped
       • bool: True → 1b, False → 0b
       • int, float: rendered using str()
       • list/tuple: rendered as space‑separated q literals
@@ -61,7 +342,8 @@ class QQueryBuilder:
       • datetime.time: rendered as "HH:MM:SS.mmm"
       • datetime.timedelta: rendered as a q timespan literal ("hh:mm:ss.mmm")
       • NumPy scalars (np.generic): converted to native Python types
-      • NumPy arrays (np.ndarray): converted to lists recursively
+      • NumPy arrays (np.ndarray): numeric/boolean arrays rendered vectorized, others
+        converted to lists recursively
       • Polars DataFrame: converted to a dict of columns (if polars is available)
       • Polars Series: converted to a list
       • Other types: fall back to str(obj)
@@ -69,6 +351,40 @@ class QQueryBuilder:
     Note: This implementation does not (yet) support types like sets, frozensets, or other
           custom objects that require special formatting.
     """
+    # Exact type -> formatter, checked first by qrepr. Keyed on type(obj), so bool
+    # never reaches the int formatter and datetime never reaches the date one.
+    _DISPATCH: Dict[type, Callable[[type, Any], str]] = {
+        QSymbol: _fmt_qsymbol,
+        bool: _fmt_bool,
+        str: _fmt_str,
+        int: _fmt_number,
+        float: _fmt_number,
+        list: _fmt_list,
+        tuple: _fmt_list,
+        dict: _fmt_dict,
+        datetime.datetime: _fmt_datetime,
+        datetime.date: _fmt_date,
+        datetime.time: _fmt_time,
+        datetime.timedelta: _fmt_timedelta,
+        np.ndarray: _fmt_ndarray,
+        type(None): _fmt_none,
+    }
+    # Formatters resolved by _resolve for types missing from _DISPATCH (NumPy
+    # scalars, subclasses, Polars objects, ...), filled in lazily.
+    _RESOLVED: Dict[type, Callable[[type, Any], str]] = {}
+    # Expressions inlined into generated build() formatters for the commonest exact
+    # types; "{p}" stands for the parameter. Other types call their formatter.
+    _INLINE: Dict[type, str] = {
+        int: "str({p})",
+        float: "str({p})",
+        bool: "('1b' if {p} else '0b')",
+        QSymbol: "f'`{{{p}.value}}'",
+        type(None): "'0N'",
+    }
+    # Generated build() formatters keyed by (builder class, function name, parameter
+    # types), see _compile_formatter.
+    _FORMATTER_CACHE: Dict[Tuple[type, str, Tuple[type, ...]], Callable[[type, List[Any]], str]] = {}
+
     def __init__(self, function_name: str, params: Optional[List[Any]] = None) -> None:
         """
         Initialize a QQueryBuilder instance.
@@ -93,15 +409,53 @@ class QQueryBuilder:
         """
         if not self.params:
             return self.function_name
-        params_str: str = "; ".join(self.qrepr(p) for p in self.params)
-        return f"{self.function_name}[{params_str}]"
+        cls: type = type(self)
+        key = (cls, self.function_name, tuple(map(type, self.params)))
+        formatter = cls._FORMATTER_CACHE.get(key)
+        if formatter is None:
+            formatter = cls._compile_formatter(self.function_name, key[2])
+            cls._FORMATTER_CACHE[key] = formatter
+        return formatter(cls, self.params)
+
+    @classmethod
+    def _compile_formatter(cls, function_name: str, signature: Tuple[type, ...]) -> Callable[[type, List[Any]], str]:
+        """
+        Generate a straight-line formatter for one call shape.
+        
+        The returned function renders a parameter list whose element types match
+        `signature` exactly, with the function name baked in as a literal. Types in
+        _INLINE are rendered by inline expressions; every other parameter calls the
+        formatter qrepr would dispatch to, resolved once here instead of per call.
+        
+        Args:
+            function_name (str): The q function name to be called.
+            signature (Tuple[type, ...]): The type of each parameter, in order.
+            
+        Returns:
+            Callable[[type, List[Any]], str]: Formatter taking (cls, params).
+        """
+        namespace: Dict[str, Any] = {}
+        parts: List[str] = []
+        for i, tp in enumerate(signature):
+            p: str = f"ps[{i}]"
+            template: Optional[str] = cls._INLINE.get(tp)
+            if template is not None:
+                parts.append(template.format(p=p))
+            else:
+                namespace[f"h{i}"] = cls._DISPATCH.get(tp) or cls._RESOLVED.get(tp) or cls._resolve(tp)
+                parts.append(f"h{i}(cls, {p})")
+        body: str = " + '; ' + ".join(parts)
+        source: str = f"def formatter(cls, ps):\n    return {function_name + '[' !r} + {body} + ']'\n"
+        exec(source, namespace)
+        return namespace["formatter"]
 
     @classmethod
     def qrepr(cls, obj: Any) -> str:
         """
         Recursively convert a Python object into a q literal string.
         
-        Uses structural pattern matching (match/case) to handle various types.
+        Looks the formatter up by exact type in _DISPATCH, falling back to
+        _resolve (and its per-type cache) for any other type.
         
         Args:
             obj (Any): The Python object to be converted.
@@ -109,63 +463,60 @@ class QQueryBuilder:
         Returns:
             str: The q literal representation of the object.
         """
-        match obj:
-            case QSymbol(value):
-                return f"`{value}"
-            case bool(b):
-                return "1b" if b else "0b"
-            case str():
-                # Escape embedded double quotes
-                escaped: str = obj.replace('"', '\\"')
-                return f'"{escaped}"'
-            case int() | float():
-                return str(obj)
-            case list() | tuple():
-                # Render lists/tuples as space-separated q literals.
-                return " ".join(cls.qrepr(item) for item in obj)
-            case dict():
-                # Render as dictionary: keys!values (both as space-separated lists).
-                keys: str = " ".join(cls.qrepr(k) for k in obj.keys())
-                values: str = " ".join(cls.qrepr(v) for v in obj.values())
-                return f"{keys}!{values}"
-            case datetime.datetime():
-                # Format as "YYYY.MM.DDDHH:MM:SS.mmm" with a D separator.
-                s: str = obj.strftime("%Y.%m.%dD%H:%M:%S.%f")[:-3]
-                return f'"{s}"'
-            case datetime.date():
-                # Render date as "YYYY.MM.DD".
-                s: str = obj.strftime("%Y.%m.%d")
-                return f'"{s}"'
-            case datetime.time():
-                # Render time as "HH:MM:SS.mmm".
-                s: str = obj.strftime("%H:%M:%S.%f")[:-3]
-                return f'"{s}"'
-            case datetime.timedelta():
-                # Convert timedelta to a q timespan literal ("hh:mm:ss.mmm").
-                total_seconds: int = int(obj.total_seconds())
-                hours, rem = divmod(total_seconds, 3600)
-                minutes, seconds = divmod(rem, 60)
-                millis: int = int(obj.microseconds / 1000)
-                timespan_str: str = f"{hours:02d}:{minutes:02d}:{seconds:02d}.{millis:03d}"
-                return f'"{timespan_str}"'
-            # NumPy scalar types
-            case _ as x if isinstance(x, np.generic):
-                return str(x.item())
-            # NumPy arrays
-            case _ as x if isinstance(x, np.ndarray):
-                return cls.qrepr(x.tolist())
-            # Polars DataFrame
-            case _ as x if pl is not None and isinstance(x, pl.DataFrame):
-                # Convert to a dictionary of columns (assumed to be lists).
-                return cls.qrepr(x.to_dict(False))
-            # Polars Series
-            case _ as x if pl is not None and isinstance(x, pl.Series):
-                return cls.qrepr(x.to_list())
-            case None:
-                return "0N"
-            case _:
-                # Fallback: use str() conversion.
-                return str(obj)
+        tp: type = type(obj)
+        handler = cls._DISPATCH.get(tp) or cls._RESOLVED.get(tp) or cls._resolve(tp)
+        return handler(cls, obj)
+
+    @classmethod
+    def _resolve(cls, tp: type) -> Callable[[type, Any], str]:
+        """
+        Pick the formatter for a type not in _DISPATCH and cache it in _RESOLVED.
+        
+        Checks are made in priority order, so subclasses are rendered like their
+        nearest supported base (e.g. an IntEnum like an int).
+        
+        Args:
+            tp (type): The type of the object being converted.
+            
+        Returns:
+            Callable[[type, Any], str]: The formatter for objects of that type.
+        """
+        if issubclass(tp, QSymbol):
+            handler = _fmt_qsymbol
+        elif issubclass(tp, bool):
+            handler = _fmt_bool
+        elif issubclass(tp, str):
+            handler = _fmt_str
+        elif issubclass(tp, (int, float)):
+            handler = _fmt_number
+        elif issubclass(tp, (list, tuple)):
+            handler = _fmt_list
+        elif issubclass(tp, dict):
+            handler = _fmt_dict
+        elif issubclass(tp, datetime.datetime):
+            handler = _fmt_datetime
+        elif issubclass(tp, datetime.date):
+            handler = _fmt_date
+        elif issubclass(tp, datetime.time):
+            handler = _fmt_time
+        elif issubclass(tp, datetime.timedelta):
+            handler = _fmt_timedelta
+        # NumPy scalar types
+        elif issubclass(tp, np.generic):
+            handler = _fmt_np_generic
+        # NumPy arrays
+        elif issubclass(tp, np.ndarray):
+            handler = _fmt_ndarray
+        # Polars DataFrame
+        elif pl is not None and issubclass(tp, pl.DataFrame):
+            handler = _fmt_pl_dataframe
+        # Polars Series
+        elif pl is not None and issubclass(tp, pl.Series):
+            handler = _fmt_pl_series
+        else:
+            handler = _fmt_fallback
+        cls._RESOLVED[tp] = handler
+        return handler
 
 
 # Example usage:
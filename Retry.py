@@ -1,7 +1,131 @@
+import concurrent.futures
 import functools
+import threading
 import time
 
-def retry_and_subdivide(chunk_dim='symbols', max_retries=3):
+# Maximum number of subqueries run concurrently by the shared default executor. The
+# subqueries are blocking network round-trips, so this is not tied to the CPU count.
+MAX_WORKERS = 8
+
+_default_executor = None
+_default_executor_lock = threading.Lock()
+
+def default_executor():
+    """
+    Returns the ThreadPoolExecutor shared by every retry_and_subdivide function (and
+    QClient) that isn't given its own, creating it on first use.
+    """
+    global _default_executor
+    if _default_executor is None:
+        with _default_executor_lock:
+            if _default_executor is None:
+                _default_executor = concurrent.futures.ThreadPoolExecutor(
+                    max_workers=MAX_WORKERS, thread_name_prefix="subdivide")
+    return _default_executor
+
+# Set on threads that run subqueries (and Retry2.Batcher calls). A retry_and_subdivide
+# or QClient call made from such a thread, i.e. nested in another query, runs its
+# subqueries inline: submitting them and waiting could leave every worker of a bounded
+# pool blocked on queued work that no worker is free to run.
+_worker = threading.local()
+
+def mark_worker_thread():
+    """
+    Marks the calling thread as a subquery worker, so queries nested in whatever it
+    runs execute their subqueries on it. Usable as a ThreadPoolExecutor initializer.
+    """
+    _worker.active = True
+
+def _run_in_worker(fn, args):
+    mark_worker_thread()
+    return fn(*args)
+
+def submit_subquery(executor, fn, *args):
+    """
+    Returns a Future for fn(*args): submitted to `executor`, or already resolved by
+    running it on the calling thread if that is a subquery worker (see above).
+    """
+    if not getattr(_worker, "active", False):
+        return executor.submit(_run_in_worker, fn, args)
+    future = concurrent.futures.Future()
+    try:
+        future.set_result(fn(*args))
+    except Exception as e:
+        future.set_exception(e)
+    return future
+
+class QueryTooBigError(ValueError):
+    """
+    Raised by a query function (or IPC connection) when kdb+ rejects a query as too
+    big. Query functions should map kdb's error to this once, at the IPC boundary.
+    """
+
+def is_query_too_big(e):
+    """
+    Returns True if the exception `e` means the query was too big to run. Also accepts
+    plain ValueError("... too big ...") raises from functions not yet using
+    QueryTooBigError.
+    """
+    if isinstance(e, QueryTooBigError):
+        return True
+    return (isinstance(e, ValueError) and bool(e.args) and isinstance(e.args[0], str)
+            and "too big" in e.args[0].lower())
+
+# Seconds a too-big rejection keeps pre-splitting lists that long. After that a list
+# of that size is sent whole again, since the server's limits and load change.
+TOO_BIG_TTL = 300
+
+# Chunk sizes learned per key, which identifies the query target and chunk dimension
+# (retry_and_subdivide uses (function, chunk_dim); Retry2.QClient uses
+# (id(connection), q function name, chunk_dim)): the largest list that has succeeded,
+# and the smallest that was rejected as too big with when it was rejected.
+_MAX_OK = {}
+_MAX_TOO_BIG = {}
+_chunk_limits_lock = threading.Lock()
+
+def record_chunk_ok(key, items):
+    """
+    Notes that a query with this chunk `items` list succeeded. A list at least as long
+    as the recorded too-big size clears that record, as the rejection no longer holds.
+    """
+    if isinstance(items, list):
+        with _chunk_limits_lock:
+            _MAX_OK[key] = max(_MAX_OK.get(key, 0), len(items))
+            too_big = _MAX_TOO_BIG.get(key)
+            if too_big is not None and len(items) >= too_big[0]:
+                del _MAX_TOO_BIG[key]
+
+def record_chunk_too_big(key, items):
+    """Notes that a query with this chunk `items` list was rejected as too big."""
+    if isinstance(items, list):
+        now = time.monotonic()
+        with _chunk_limits_lock:
+            too_big = _MAX_TOO_BIG.get(key)
+            if too_big is None or now - too_big[1] > TOO_BIG_TTL or len(items) <= too_big[0]:
+                _MAX_TOO_BIG[key] = (len(items), now)
+
+def learned_chunk_size(key, items):
+    """
+    Returns the chunk size to pre-split `items` into, or None to send it whole.
+    
+    Only lists at least as long as one rejected as too big within the last TOO_BIG_TTL
+    seconds are pre-split, into chunks of the largest size known to succeed (or half
+    the rejected size if none has).
+    """
+    if not isinstance(items, list):
+        return None
+    with _chunk_limits_lock:
+        too_big = _MAX_TOO_BIG.get(key)
+        ok = _MAX_OK.get(key, 0)
+    if too_big is None or time.monotonic() - too_big[1] > TOO_BIG_TTL:
+        return None
+    too_big = too_big[0]
+    if len(items) < too_big:
+        return None
+    size = ok if 0 < ok < too_big else max(1, too_big // 2)
+    return size if size < len(items) else None
+
+def retry_and_subdivide(chunk_dim='symbols', max_retries=3, executor=None):
     """
     Decorator that wraps a query function to catch errors and, if an error
     indicates the query is too big, subdivides the query on the specified dimension.
@@ -10,43 +134,90 @@ def retry_and_subdivide(chunk_dim='symbols', max_retries=3):
     Parameters:
       chunk_dim: the keyword argument (e.g. 'symbols') whose list value should be subdivided.
       max_retries: maximum number of retries before giving up.
+      executor: concurrent.futures.Executor that runs subqueries and retries concurrently
+                (defaults to the shared default_executor()). The wrapped function may itself
+                call retry_and_subdivide/QClient queries: those nested in a subquery run
+                their own subqueries inline on its worker.
     """
     def decorator(func):
         @functools.wraps(func)
         def wrapper(*args, **kwargs):
-            return _attempt_query(func, args, kwargs, chunk_dim, max_retries, retries=0)
+            return _attempt_query(func, args, kwargs, chunk_dim, max_retries, executor or default_executor())
         return wrapper
     return decorator
 
-def _attempt_query(func, args, kwargs, chunk_dim, max_retries, retries):
-    try:
-        # Attempt the query.
-        return func(*args, **kwargs)
-    except Exception as e:
-        # Check if the error indicates the query is "too big"
-        # and if the chunk_dim value is a list with more than one element.
-        if "too big" in str(e).lower() and chunk_dim in kwargs and isinstance(kwargs[chunk_dim], list) and len(kwargs[chunk_dim]) > 1:
-            items = kwargs[chunk_dim]
-            mid = len(items) // 2
-            print(f"Subdividing query for {chunk_dim}: splitting {items} into {items[:mid]} and {items[mid:]}")
-            # Create copies of kwargs for each subquery.
-            kwargs1 = kwargs.copy()
-            kwargs2 = kwargs.copy()
-            kwargs1[chunk_dim] = items[:mid]
-            kwargs2[chunk_dim] = items[mid:]
-            # Recursively attempt each subquery.
-            result1 = _attempt_query(func, args, kwargs1, chunk_dim, max_retries, retries)
-            result2 = _attempt_query(func, args, kwargs2, chunk_dim, max_retries, retries)
-            # Combine results (assuming the function returns lists).
-            return result1 + result2
-        # For other errors, if we haven't hit the retry limit, try again.
-        elif retries < max_retries:
-            print(f"Retry {retries + 1}/{max_retries} for query with {chunk_dim}={kwargs.get(chunk_dim)} due to error: {e}")
-            time.sleep(1)  # Optional delay before retrying.
-            return _attempt_query(func, args, kwargs, chunk_dim, max_retries, retries + 1)
+def _call_query(func, args, kwargs, delay):
+    if delay:
+        time.sleep(delay)  # Optional delay before retrying.
+    return func(*args, **kwargs)
+
+def _attempt_query(func, args, kwargs, chunk_dim, max_retries, executor):
+    key = (func, chunk_dim)
+    items = kwargs.get(chunk_dim)
+    size = learned_chunk_size(key, items)
+    # In-flight subqueries: future -> (order, kwargs, retries). order is the path of
+    # chunks/halves that led to the subquery, so sorting the parts by it restores the
+    # original order.
+    inflight = {}
+    if size is None:
+        # The first attempt runs on the calling thread, and only failures fan out:
+        # halves and retries are submitted to the executor and handled in whatever
+        # order they complete.
+        try:
+            result = func(*args, **kwargs)
+        except Exception as e:
+            failed = concurrent.futures.Future()
+            failed.set_exception(e)
+            inflight[failed] = ((), kwargs, 0)
         else:
-            print("Max retries exceeded. Raising exception.")
-            raise
+            record_chunk_ok(key, items)
+            return result
+    else:
+        # A list this long has been too big before: skip the doomed attempt and send
+        # chunks of a size that has worked instead.
+        print(f"Pre-splitting query for {chunk_dim} into chunks of {size}")
+        for i, start in enumerate(range(0, len(items), size)):
+            chunk_kwargs = {**kwargs, chunk_dim: items[start:start + size]}
+            inflight[submit_subquery(executor, _call_query, func, args, chunk_kwargs, 0)] = ((i,), chunk_kwargs, 0)
+    parts = []
+    while inflight:
+        done, _ = concurrent.futures.wait(inflight, return_when=concurrent.futures.FIRST_COMPLETED)
+        for future in done:
+            order, kwargs, retries = inflight.pop(future)
+            items = kwargs.get(chunk_dim)
+            try:
+                result = future.result()
+            except Exception as e:
+                # Check if the error indicates the query is "too big"
+                # and if the chunk_dim value is a list with more than one element.
+                if is_query_too_big(e) and isinstance(items, list) and len(items) > 1:
+                    record_chunk_too_big(key, items)
+                    mid = len(items) // 2
+                    print(f"Subdividing query for {chunk_dim}: splitting {items} into {items[:mid]} and {items[mid:]}")
+                    kwargs1 = {**kwargs, chunk_dim: items[:mid]}
+                    kwargs2 = {**kwargs, chunk_dim: items[mid:]}
+                    inflight[submit_subquery(executor, _call_query, func, args, kwargs1, 0)] = (order + (0,), kwargs1, retries)
+                    inflight[submit_subquery(executor, _call_query, func, args, kwargs2, 0)] = (order + (1,), kwargs2, retries)
+                # For other errors, if we haven't hit the retry limit, try again.
+                elif retries < max_retries:
+                    print(f"Retry {retries + 1}/{max_retries} for query with {chunk_dim}={kwargs.get(chunk_dim)} due to error: {e}")
+                    inflight[submit_subquery(executor, _call_query, func, args, kwargs, 1)] = (order, kwargs, retries + 1)
+                else:
+                    print("Max retries exceeded. Raising exception.")
+                    for queued in inflight:
+                        queued.cancel()
+                    raise
+            else:
+                record_chunk_ok(key, items)
+                parts.append((order, result))
+    if len(parts) == 1:
+        return parts[0][1]
+    # Combine results (assuming the function returns lists).
+    parts.sort(key=lambda part: part[0])
+    results = []
+    for _, part in parts:
+        results.extend(part)
+    return results
 
 # Example query function simulating a kdb/IPC call.
 @retry_and_subdivide(chunk_dim='symbols', max_retries=2)
@@ -63,7 +234,7 @@ def run_query(*args, **kwargs):
     
     # Simulate the "too big" condition.
     if isinstance(symbols, list) and len(symbols) > 3:
-        raise ValueError("Query too big")
+        raise QueryTooBigError("Query too big")
     
     print(f"Executing query for symbols: {symbols}, Date: {start_date} to {end_date}, Time: {start_time} to {end_time}")
     # Simulate a successful query result.
@@ -1,64 +1,368 @@
-import functools
+import concurrent.futures
+import copy
+import hashlib
+import pickle
+import queue
+import threading
 import time
 
-def _attempt_q_call(connection, func_name, args, kwargs, chunk_dims, max_retries, retries):
+from Retry import (MAX_WORKERS, QueryTooBigError, default_executor, is_query_too_big, learned_chunk_size,
+                   mark_worker_thread, record_chunk_ok, record_chunk_too_big, retry_and_subdivide, submit_subquery)
+
+# Calls currently on the wire, keyed by _inflight_key, so identical concurrent calls
+# to functions configured with 'dedup' share one round-trip. Each entry is [future, number of callers that joined it].
+_INFLIGHT = {}
+_inflight_lock = threading.Lock()
+
+def _inflight_key(connection, func_name, args, kwargs):
+    try:
+        payload = pickle.dumps((func_name, args, sorted(kwargs.items())), protocol=pickle.HIGHEST_PROTOCOL)
+    except Exception:
+        return None  # Arguments that can't be pickled are never deduplicated.
+    return id(connection), hashlib.blake2b(payload, digest_size=16).digest()
+
+def _call_q(connection, func_name, args, kwargs, delay, dedup):
+    if delay:
+        time.sleep(delay)
+    # Only read-only functions opt in: two identical writes must both reach the server,
+    # and building the key pickles and hashes every argument.
+    key = _inflight_key(connection, func_name, args, kwargs) if dedup else None
+    if key is None:
+        # Replace this with your actual IPC call:
+        return connection.call_q(func_name, *args, **kwargs)
+    with _inflight_lock:
+        entry = _INFLIGHT.get(key)
+        issuer = entry is None
+        if issuer:
+            entry = _INFLIGHT[key] = [concurrent.futures.Future(), 0]
+        else:
+            entry[1] += 1
+    future = entry[0]
+    if not issuer:
+        # An identical call is already on the wire: wait for its outcome (or the same
+        # exception, to run our own retry logic). Every caller gets its own copy of the
+        # result, as it would without deduplication.
+        return copy.deepcopy(future.result())
     try:
         # Replace this with your actual IPC call:
         result = connection.call_q(func_name, *args, **kwargs)
-        return result
-    except Exception as e:
-        # Check each candidate chunk dimension in order
-        for chunk_dim in chunk_dims:
-            if (chunk_dim in kwargs and isinstance(kwargs[chunk_dim], list) and 
-                len(kwargs[chunk_dim]) > 1 and "too big" in str(e).lower()):
-                items = kwargs[chunk_dim]
-                mid = len(items) // 2
-                print(f"Subdividing {func_name} on '{chunk_dim}': splitting {items} into {items[:mid]} and {items[mid:]}")
-                # Create two new kwargs dictionaries for each subquery.
-                kwargs1 = kwargs.copy()
-                kwargs2 = kwargs.copy()
-                kwargs1[chunk_dim] = items[:mid]
-                kwargs2[chunk_dim] = items[mid:]
-                res1 = _attempt_q_call(connection, func_name, args, kwargs1, chunk_dims, max_retries, retries)
-                res2 = _attempt_q_call(connection, func_name, args, kwargs2, chunk_dims, max_retries, retries)
-                # Assume results can be concatenated (adjust as needed)
-                return res1 + res2
-        # If no chunkable dimension was found or the error is not "too big", try a retry.
-        if retries < max_retries:
-            print(f"Retry {retries+1}/{max_retries} for {func_name} with kwargs={kwargs} due to error: {e}")
-            time.sleep(1)
-            return _attempt_q_call(connection, func_name, args, kwargs, chunk_dims, max_retries, retries + 1)
+    except BaseException as e:
+        with _inflight_lock:
+            del _INFLIGHT[key]
+        future.set_exception(e)
+        raise
+    with _inflight_lock:
+        del _INFLIGHT[key]
+        joined = entry[1]
+    future.set_result(result)
+    # Joiners copy the result held by the future, so if there are any the issuer
+    # mustn't be handed (and free to mutate) that same object either.
+    return copy.deepcopy(result) if joined else result
+
+def _limits_key(connection, func_name, chunk_dim):
+    # Learned chunk limits are per kdb+ connection and q function.
+    return id(connection), func_name, chunk_dim
+
+def _record_ok(connection, func_name, kwargs, chunk_dims):
+    for chunk_dim in chunk_dims:
+        record_chunk_ok(_limits_key(connection, func_name, chunk_dim), kwargs.get(chunk_dim))
+
+def _attempt_q_call(connection, func_name, args, kwargs, chunk_dims, max_retries, executor, dedup):
+    # In-flight subqueries: future -> (order, kwargs, retries). order is the path of
+    # chunks/halves that led to the subquery, so sorting the parts by it restores the
+    # original order.
+    inflight = {}
+    # Pre-split on the first dimension whose list is as long as one already rejected.
+    for chunk_dim in chunk_dims:
+        items = kwargs.get(chunk_dim)
+        size = learned_chunk_size(_limits_key(connection, func_name, chunk_dim), items)
+        if size is not None:
+            print(f"Pre-splitting {func_name} on '{chunk_dim}' into chunks of {size}")
+            for i, start in enumerate(range(0, len(items), size)):
+                chunk_kwargs = {**kwargs, chunk_dim: items[start:start + size]}
+                inflight[submit_subquery(executor, _call_q, connection, func_name, args, chunk_kwargs, 0, dedup)] = ((i,), chunk_kwargs, 0)
+            break
+    else:
+        # The first attempt runs on the calling thread, and only failures fan out:
+        # halves and retries are submitted to the executor and handled in whatever
+        # order they complete.
+        try:
+            result = _call_q(connection, func_name, args, kwargs, 0, dedup)
+        except Exception as e:
+            failed = concurrent.futures.Future()
+            failed.set_exception(e)
+            inflight[failed] = ((), kwargs, 0)
         else:
-            print(f"Max retries exceeded for {func_name}.")
-            raise
+            _record_ok(connection, func_name, kwargs, chunk_dims)
+            return result
+    parts = []
+    while inflight:
+        done, _ = concurrent.futures.wait(inflight, return_when=concurrent.futures.FIRST_COMPLETED)
+        for future in done:
+            order, kwargs, retries = inflight.pop(future)
+            try:
+                result = future.result()
+            except Exception as e:
+                # Check each candidate chunk dimension in order
+                for chunk_dim in chunk_dims:
+                    items = kwargs.get(chunk_dim)
+                    if is_query_too_big(e) and isinstance(items, list) and len(items) > 1:
+                        record_chunk_too_big(_limits_key(connection, func_name, chunk_dim), items)
+                        mid = len(items) // 2
+                        print(f"Subdividing {func_name} on '{chunk_dim}': splitting {items} into {items[:mid]} and {items[mid:]}")
+                        kwargs1 = {**kwargs, chunk_dim: items[:mid]}
+                        kwargs2 = {**kwargs, chunk_dim: items[mid:]}
+                        inflight[submit_subquery(executor, _call_q, connection, func_name, args, kwargs1, 0, dedup)] = (order + (0,), kwargs1, retries)
+                        inflight[submit_subquery(executor, _call_q, connection, func_name, args, kwargs2, 0, dedup)] = (order + (1,), kwargs2, retries)
+                        break
+                else:
+                    # If no chunkable dimension was found or the error is not "too big", try a retry.
+                    if retries < max_retries:
+                        print(f"Retry {retries+1}/{max_retries} for {func_name} with kwargs={kwargs} due to error: {e}")
+                        inflight[submit_subquery(executor, _call_q, connection, func_name, args, kwargs, 1, dedup)] = (order, kwargs, retries + 1)
+                    else:
+                        print(f"Max retries exceeded for {func_name}.")
+                        for queued in inflight:
+                            queued.cancel()
+                        raise
+            else:
+                _record_ok(connection, func_name, kwargs, chunk_dims)
+                parts.append((order, result))
+    if len(parts) == 1:
+        return parts[0][1]
+    # Assume results can be concatenated (adjust as needed)
+    parts.sort(key=lambda part: part[0])
+    results = []
+    for _, part in parts:
+        results.extend(part)
+    return results
+
+class Batcher:
+    """
+    Coalesces concurrent calls to one q function into shared wire requests.
+
+    Calls are queued and a background thread collects them for up to max_wait_ms (or
+    until max_batch `dim` items are pending). Calls whose other arguments match are
+    merged into one call with the union of their `dim` lists, and each caller gets back
+    the result rows whose `key` field is one of its own items. Merged calls still go
+    through `call` (normally the client's retry/subdivide wrapper), so a batch that
+    turns out too big is split like any other query.
+
+    Each merged call runs on its own worker (up to max_workers at once), so a slow or
+    retrying call doesn't hold up unrelated ones. The workers are marked as subquery
+    workers (Retry.mark_worker_thread), so a merged call that has to be split or
+    retried does so on its worker rather than waiting on the shared subquery pool,
+    which may itself be waiting on this Batcher.
+    """
+    def __init__(self, call, dim="symbols", key="symbol", max_wait_ms=5, max_batch=64, max_workers=MAX_WORKERS):
+        self.call = call
+        self.dim = dim
+        self.key = key
+        self.max_wait = max_wait_ms / 1000
+        self.max_batch = max_batch
+        name = f"batcher-{getattr(call, '__name__', 'q')}"
+        self._workers = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name,
+                                                             initializer=mark_worker_thread)
+        self._queue = queue.Queue()
+        self._closed = False
+        self._close_lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def __call__(self, *args, **kwargs):
+        return self.submit(*args, **kwargs).result()
+
+    def submit(self, *args, **kwargs):
+        """Queues a call and returns a Future for its result."""
+        future = concurrent.futures.Future()
+        with self._close_lock:
+            if self._closed:
+                raise RuntimeError("Batcher is closed")
+            self._queue.put((args, kwargs, future))
+        return future
+
+    def close(self):
+        """Sends the calls already queued, waits for their results and stops the threads."""
+        with self._close_lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._queue.put(None)
+        self._thread.join()
+        self._workers.shutdown(wait=True)
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            pending = [item]
+            count = self._size(item)
+            deadline = time.monotonic() + self.max_wait
+            stop = False
+            while count < self.max_batch:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                pending.append(item)
+                count += self._size(item)
+            for bucket in self._buckets(pending):
+                try:
+                    self._workers.submit(self._dispatch, bucket)
+                except BaseException as e:
+                    # Keep collecting: fail this bucket's calls rather than every later one.
+                    for _, _, future in bucket:
+                        if future.set_running_or_notify_cancel():
+                            future.set_exception(e)
+            if stop:
+                return
+
+    def _size(self, item):
+        items = item[1].get(self.dim)
+        return len(items) if isinstance(items, list) else 1
+
+    def _buckets(self, pending):
+        # Group calls that differ only in their `dim` list. Calls without a `dim` list, or
+        # whose other arguments can't be pickled, are sent on their own.
+        buckets = {}
+        for args, kwargs, future in pending:
+            if isinstance(kwargs.get(self.dim), list):
+                rest = {k: v for k, v in kwargs.items() if k != self.dim}
+                try:
+                    bucket_key = pickle.dumps((args, sorted(rest.items())), protocol=pickle.HIGHEST_PROTOCOL)
+                except Exception:
+                    bucket_key = id(future)
+            else:
+                bucket_key = id(future)
+            buckets.setdefault(bucket_key, []).append((args, kwargs, future))
+        return buckets.values()
+
+    def _dispatch(self, bucket):
+        # Calls whose futures the caller cancelled are dropped; the rest can no longer
+        # be cancelled, so resolving them can't fail.
+        bucket = [item for item in bucket if item[2].set_running_or_notify_cancel()]
+        if not bucket:
+            return
+        if len(bucket) == 1:
+            args, kwargs, future = bucket[0]
+            self._resolve(future, lambda: self.call(*args, **kwargs))
+            return
+        try:
+            args, kwargs, _ = bucket[0]
+            merged = list(dict.fromkeys(item for _, kw, _ in bucket for item in kw[self.dim]))
+            result = self.call(*args, **{**kwargs, self.dim: merged})
+            rows_by_item = {}
+            for row in result:
+                rows_by_item.setdefault(row[self.key], []).append(row)
+            # Every caller gets its own row objects, as it would unbatched: the first to
+            # ask for an item gets the result's rows, anyone else asking for it copies
+            # (made before any caller can see, and mutate, the originals).
+            handed_out = set()
+            results = []
+            for _, kw, future in bucket:
+                rows = []
+                for item in kw[self.dim]:
+                    item_rows = rows_by_item.get(item, [])
+                    if item in handed_out:
+                        item_rows = copy.deepcopy(item_rows)
+                    else:
+                        handed_out.add(item)
+                    rows.extend(item_rows)
+                results.append((future, rows))
+        except BaseException as e:
+            for _, _, future in bucket:
+                future.set_exception(e)
+            return
+        for future, rows in results:
+            future.set_result(rows)
+
+    @staticmethod
+    def _resolve(future, fn):
+        try:
+            future.set_result(fn())
+        except BaseException as e:
+            future.set_exception(e)
 
 class QClient:
-    def __init__(self, connection, config):
+    def __init__(self, connection, config, executor=None):
         """
-        connection: your IPC connection to the kdb instance.
+        connection: your IPC connection to the kdb instance (must be safe to call from
+                    several threads at once, since subqueries run concurrently).
+        executor: concurrent.futures.Executor for subqueries and retries; defaults to the
+                  pool shared with Retry.retry_and_subdivide. A function's config may
+                  override it with its own 'executor' entry.
         config: mapping of q function names to their configuration, e.g.:
             {
                 'getData': {
                     'chunk_dims': ['symbols'],  # For functions that have only symbols and a date.
-                    'max_retries': 3
+                    'max_retries': 3,
+                    'dedup': True   # Optional, read-only functions only: identical
+                                    # concurrent calls share one round-trip.
                 },
                 'getStats': {
                     'chunk_dims': ['symbols', 'date_range'],  # For functions that accept both.
                     'max_retries': 2
+                },
+                'getQuote': {
+                    'chunk_dims': ['symbols'],
+                    'batch': True,        # Coalesce concurrent calls (see Batcher).
+                    'max_wait_ms': 5,     # Optional: how long to collect calls for.
+                    'max_batch': 64       # Optional: max symbols merged per call.
                 }
             }
         """
         self.connection = connection
         self.config = config
+        self.executor = executor
+        self._batchers = []
+        self._lock = threading.Lock()
+
+    def close(self):
+        """
+        Stops the background threads of the client's batched functions (after sending
+        the calls already queued); calling those functions afterwards raises
+        RuntimeError. The threads keep the client alive until then.
+        """
+        with self._lock:
+            batchers, self._batchers = self._batchers, []
+        for batcher in batchers:
+            batcher.close()
 
     def __getattr__(self, func_name):
+        # Only called for names not found normally. Private/dunder lookups (copy, pickle,
+        # ...) aren't q functions.
+        if func_name.startswith("_"):
+            raise AttributeError(func_name)
+        with self._lock:
+            # Another thread may have created the wrapper while we waited for the lock.
+            q_func = self.__dict__.get(func_name)
+            if q_func is None:
+                q_func = self._make_q_func(func_name)
+            return q_func
+
+    def _make_q_func(self, func_name):
         cfg = self.config.get(func_name, {})
         chunk_dims = cfg.get("chunk_dims", [])
         max_retries = cfg.get("max_retries", 3)
+        dedup = cfg.get("dedup", False)
+        executor = cfg.get("executor") or self.executor or default_executor()
 
-        @functools.wraps(func_name)
         def q_func(*args, **kwargs):
-            return _attempt_q_call(self.connection, func_name, args, kwargs, chunk_dims, max_retries, retries=0)
+            return _attempt_q_call(self.connection, func_name, args, kwargs, chunk_dims, max_retries, executor, dedup)
+        q_func.__name__ = q_func.__qualname__ = func_name
+        if cfg.get("batch"):
+            q_func = Batcher(q_func, max_wait_ms=cfg.get("max_wait_ms", 5), max_batch=cfg.get("max_batch", 64))
+            self._batchers.append(q_func)
+        # Cache on the instance, so later calls are a plain attribute read and skip
+        # __getattr__ entirely.
+        self.__dict__[func_name] = q_func
         return q_func
 
 # Dummy connection simulating a kdb IPC interface.
@@ -68,11 +372,11 @@ class DummyKdbConnection:
         # This is just an illustrative condition.
         for key in ['symbols', 'date_range', 'time_range']:
             if key in kwargs and isinstance(kwargs[key], list) and len(kwargs[key]) > 3:
-                raise ValueError("Query too big")
+                raise QueryTooBigError("Query too big")
         print(f"Executing {func_name} with args {args} and kwargs {kwargs}")
         # Simulated result.
         if 'symbols' in kwargs:
-            return [{"result": f"{func_name} result for {sym}"} for sym in kwargs['symbols']]
+            return [{"symbol": sym, "result": f"{func_name} result for {sym}"} for sym in kwargs['symbols']]
         return [{"result": f"{func_name} result"}]
 
 # Example usage:
@@ -93,6 +397,12 @@ if __name__ == '__main__':
         'getDataByDateTimeRange': {
             'chunk_dims': ['symbols', 'date_range', 'time_range'],  
             'max_retries': 2
+        },
+        # A function whose concurrent per-symbol calls are batched into one request.
+        'getQuote': {
+            'chunk_dims': ['symbols'],
+            'batch': True,
+            'dedup': True
         }
     }
 
@@ -132,3 +442,31 @@ if __name__ == '__main__':
         print(result)
     except Exception as ex:
         print(f"Error in getDataByDateTimeRange: {ex}")
+
+    # Example: concurrent single-symbol calls coalesced by the batcher.
+    try:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=3) as pool:
+            futures = {sym: pool.submit(client.getQuote, symbols=[sym], date="2025-01-01")
+                       for sym in ['AAPL', 'GOOG', 'MSFT']}
+        print("\nResult for getQuote:")
+        for sym, future in futures.items():
+            print(sym, future.result())
+    except Exception as ex:
+        print(f"Error in getQuote: {ex}")
+
+    # Example: a retry_and_subdivide query function that itself calls the client. The
+    # client's subqueries then run on the outer subquery's worker instead of queueing
+    # behind it on the shared pool.
+    @retry_and_subdivide(chunk_dim='symbols', max_retries=1)
+    def getDataInBlocks(symbols, date):
+        if len(symbols) > 20:
+            raise QueryTooBigError("Query too big")
+        return client.getDataByDate(symbols=symbols, date=date)
+
+    try:
+        result = getDataInBlocks(symbols=[f"SYM{i}" for i in range(160)], date="2025-01-01")
+        print(f"\nResult for getDataInBlocks: {len(result)} rows")
+    except Exception as ex:
+        print(f"Error in getDataInBlocks: {ex}")
+
+    client.close()
@@ -0,0 +1,63 @@
+# cython: language_level=3, boundscheck=False, wraparound=False
+"""
+C renderers for lists whose elements all share one primitive type, used by
+Query_builder.QQueryBuilder in place of its per-element formatters.
+
+Build in place with:
+    cythonize -i qrepr_ext.pyx
+
+Each function returns exactly what QQueryBuilder.qrepr would for the same list;
+Query_builder falls back to pure-Python renderers when this module isn't built
+(and always uses them for floats, whose str() already runs in C).
+"""
+from cpython.list cimport PyList_New, PyList_SET_ITEM
+from cpython.ref cimport Py_INCREF
+from cpython.unicode cimport PyUnicode_Join
+
+# Translation table for escaping characters inside q string literals.
+cdef dict _ESCAPE_TABLE = str.maketrans({'"': '\\"', "\\": "\\\\"})
+
+cdef inline list _as_list(object xs):
+    return xs if type(xs) is list else list(xs)
+
+cdef inline str _join(list parts):
+    return PyUnicode_Join(" ", parts)
+
+cpdef str render_int_list(object xs):
+    """Render a list of ints as space-separated q longs."""
+    cdef list items = _as_list(xs)
+    cdef Py_ssize_t i, n = len(items)
+    cdef list parts = PyList_New(n)
+    cdef str s
+    for i in range(n):
+        s = str(items[i])
+        Py_INCREF(s)
+        PyList_SET_ITEM(parts, i, s)
+    return _join(parts)
+
+cpdef str render_str_list(object xs):
+    """Render a list of str as space-separated, escaped q strings."""
+    cdef list items = _as_list(xs)
+    cdef Py_ssize_t i, n = len(items)
+    cdef list parts = PyList_New(n)
+    cdef str x, s
+    for i in range(n):
+        x = items[i]
+        if '"' in x or "\\" in x:
+            x = x.translate(_ESCAPE_TABLE)
+        s = '"' + x + '"'
+        Py_INCREF(s)
+        PyList_SET_ITEM(parts, i, s)
+    return _join(parts)
+
+cpdef str render_qsymbol_list(object xs):
+    """Render a list of QSymbol as space-separated q symbols."""
+    cdef list items = _as_list(xs)
+    cdef Py_ssize_t i, n = len(items)
+    cdef list parts = PyList_New(n)
+    cdef str s
+    for i in range(n):
+        s = f"`{items[i].value}"
+        Py_INCREF(s)
+        PyList_SET_ITEM(parts, i, s)
+    return _join(parts)